@@ -1,18 +1,85 @@
 #!/usr/bin/env python3
 """Minimal Flask + ngrok agent scaffold."""
 
+import functools
 import logging
+import math
+import re
 import threading
 import uuid
+from collections import OrderedDict
+from collections.abc import Iterator
+from typing import Any, NoReturn, cast
 
+import orjson
+import waitress
 from absl import app as absl_app
 from absl import flags
-from flask import Flask, jsonify, request
+from flask import Flask, Response, abort, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.exceptions import HTTPException
+
+from agents import ASSISTANT_ROLE, USER_ROLE, CachedAgent, Message, StreamingAgent, create_agent_from_env
+
+
+def _replace_non_finite(obj: Any) -> Any:
+    """Replace NaN and infinities with None, as orjson encodes them (as ``null``)."""
+
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _replace_non_finite(value) for key, value in obj.items()}
+    if isinstance(obj, list | tuple):
+        return [_replace_non_finite(value) for value in obj]
+    return obj
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that encodes responses and decodes request bodies with orjson.
+
+    orjson emits UTF-8 directly, so non-ASCII text is never escaped. Objects orjson
+    cannot encode or decode (such as integers wider than 64 bits, or ``NaN`` in a
+    request body) and calls with stdlib ``kwargs`` fall back to ``DefaultJSONProvider``. Both paths encode dates via
+    Flask's ``default`` and NaN/infinities as ``null``.
+    """
+
+    def _option(self) -> int:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if not kwargs:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self._option()).decode()
+            except TypeError:
+                pass
+        return super().dumps(_replace_non_finite(obj), **kwargs)
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        if not kwargs:
+            try:
+                return orjson.loads(s)
+            except orjson.JSONDecodeError:
+                pass
+        # The stdlib decoder accepts NaN, out-of-range floats and lone surrogates
+        return super().loads(s, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        option = self._option()
+        if self.compact is False or (self.compact is None and self._app.debug):
+            option |= orjson.OPT_INDENT_2
+        try:
+            body = orjson.dumps(obj, default=self.default, option=option)
+        except TypeError:
+            return cast(Response, super().response(_replace_non_finite(obj)))
+        return Response(body, mimetype=self.mimetype)
 
-from agents import Message, create_agent_from_env
 
 app = Flask(__name__)
-app.config["JSON_AS_ASCII"] = False  # Disable unicode escaping for better readability
+app.json = OrjsonProvider(app)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -23,41 +90,76 @@ FLAGS = flags.FLAGS
 flags.DEFINE_string(
     "host",
     "0.0.0.0",
-    "Host interface that the Flask development server binds to.",
+    "Host interface that the server binds to.",
+)
+flags.DEFINE_integer("port", 5050, "Port exposed by the server.")
+flags.DEFINE_bool("debug", False, "Run the Flask development server in debug mode instead of waitress.")
+flags.DEFINE_integer(
+    "threads",
+    32,
+    "Worker threads for the waitress server. Agent calls are I/O-bound, so size this for concurrent chats.",
+)
+flags.DEFINE_integer(
+    "response_cache_size",
+    0,
+    "Cache up to this many agent responses keyed by conversation (0 disables). Only for deterministic agents.",
 )
-flags.DEFINE_integer("port", 5050, "Port exposed by the Flask development server.")
-flags.DEFINE_bool("debug", False, "Run the Flask development server in debug mode.")
 
 # Validation guardrails
 MAX_MESSAGE_LENGTH = 1_000_000
-
-# Simple in-memory conversation history
-# Structure: {session_id: [Message, Message, ...]}
-conversations: dict[str, list[Message]] = {}
+MAX_SESSION_ID_LENGTH = 128
+SESSION_ID_PATTERN = re.compile(rf"[A-Za-z0-9-]{{1,{MAX_SESSION_ID_LENGTH}}}")
+
+# Memory guardrails: least recently used sessions are evicted beyond MAX_SESSIONS,
+# and each session keeps only its most recent MAX_HISTORY_MESSAGES messages.
+MAX_SESSIONS = 10_000
+MAX_HISTORY_MESSAGES = 100
+
+# Simple in-memory conversation history, ordered from least to most recently used.
+# Histories are immutable tuples, so readers can share them without copying.
+# Structure: {session_id: (Message, Message, ...)}
+conversations: OrderedDict[str, tuple[Message, ...]] = OrderedDict()
 conversations_lock = threading.Lock()
 
 
 def _valid_session_id(session_id: str) -> bool:
-    """Session IDs: 1-128 chars, alphanumeric and hyphens only."""
+    """Session IDs: 1-128 chars, ASCII letters, digits and hyphens only."""
+
+    return SESSION_ID_PATTERN.fullmatch(session_id) is not None
 
-    if not session_id or len(session_id) > 128:
-        return False
-    return all(char.isalnum() or char == "-" for char in session_id)
 
+def _touch_history(session_id: str) -> tuple[Message, ...]:
+    """Return the stored history for a session and mark it most recently used.
+
+    Creates the session if needed, evicting the least recently used one once
+    MAX_SESSIONS is exceeded. Callers must hold ``conversations_lock``.
+    """
+
+    history = conversations.get(session_id)
+    if history is None:
+        history = conversations[session_id] = ()
+        if len(conversations) > MAX_SESSIONS:
+            conversations.popitem(last=False)
+    else:
+        conversations.move_to_end(session_id)
+    return history
 
-def _get_history(session_id: str) -> list[Message]:
-    """Return a copy of the conversation history for a session (creating it if needed)."""
+
+def _get_history(session_id: str) -> tuple[Message, ...]:
+    """Return the conversation history for a session (creating it if needed)."""
 
     with conversations_lock:
-        return conversations.setdefault(session_id, []).copy()
+        return _touch_history(session_id)
 
 
-def _peek_conversation(session_id: str) -> list[Message] | None:
-    """Return a copy of the stored conversation without creating it."""
+def _peek_conversation(session_id: str) -> tuple[Message, ...] | None:
+    """Return the stored conversation without creating it, marking it most recently used."""
 
     with conversations_lock:
         history = conversations.get(session_id)
-        return history.copy() if history is not None else None
+        if history is not None:
+            conversations.move_to_end(session_id)
+        return history
 
 
 def _clear_conversation(session_id: str) -> bool:
@@ -70,30 +172,110 @@ def _clear_conversation(session_id: str) -> bool:
 def _store_messages(session_id: str, user_message: str, response: str) -> None:
     """Persist the latest user/assistant turns."""
 
+    turn = (Message(USER_ROLE, user_message), Message(ASSISTANT_ROLE, response))
+
     with conversations_lock:
-        history = conversations.setdefault(session_id, [])
-        history.append(Message("user", user_message))
-        history.append(Message("assistant", response))
+        # The session may have been evicted or cleared meanwhile; touching re-inserts it.
+        conversations[session_id] = (_touch_history(session_id) + turn)[-MAX_HISTORY_MESSAGES:]
 
 
-@app.get("/")
-def home():
-    """Rich health check with endpoint documentation."""
+@functools.lru_cache(maxsize=64)
+def _error_body(error: str) -> bytes:
+    """Encode an error payload once; error messages come from a small fixed set."""
 
-    return jsonify(
+    return orjson.dumps({"error": error})
+
+
+def _error_response(error: str, status: int) -> Response:
+    """Build a JSON error response from the pre-encoded body for ``error``."""
+
+    return Response(_error_body(error), status=status, mimetype="application/json")
+
+
+@app.errorhandler(Exception)
+def handle_unexpected_error(error: Exception):
+    """Log unexpected failures and answer with a JSON 500 instead of Flask's HTML page."""
+
+    if isinstance(error, HTTPException):
+        return error
+
+    logger.exception("Unhandled error")
+    return _error_response("Internal server error", 500)
+
+
+@functools.cache
+def _health_body(agent_name: str) -> bytes:
+    """Encode the health check payload once per agent; it never changes at runtime."""
+
+    return app.json.dumps(
         {
             "status": "online",
-            "agent": app.config["agent"].name,
+            "agent": agent_name,
             "message": "Agent is running",
             "max_message_length": MAX_MESSAGE_LENGTH,
             "endpoints": {
                 "/": "Health check",
                 "/chat": "POST - send a message to the agent",
+                "/chat/stream": "POST - send a message and stream the reply as server-sent events",
                 "/webhook": "POST - receive generic webhook events",
                 "/conversations/<session_id>": "GET to inspect, DELETE to clear history",
             },
         }
-    )
+    ).encode()
+
+
+@app.get("/")
+def home():
+    """Rich health check with endpoint documentation."""
+
+    return Response(_health_body(app.config["agent"].name), mimetype="application/json")
+
+
+def _abort_bad_request(error: str) -> NoReturn:
+    """Abort the current request with a 400 JSON error response."""
+
+    abort(_error_response(error, 400))
+
+
+def _parse_chat_request() -> tuple[str, str]:
+    """Validate a chat JSON payload and return ``(message, session_id)``.
+
+    Generates a session ID when none is provided. Aborts with a 400 response
+    when the payload is invalid.
+    """
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        _abort_bad_request("Invalid request")
+
+    user_message = data.get("message")
+    if user_message is None:
+        _abort_bad_request("Missing 'message' in request")
+
+    # Validate message type
+    if not isinstance(user_message, str):
+        _abort_bad_request("Message must be a string")
+
+    # Validate message length
+    if len(user_message) > MAX_MESSAGE_LENGTH:
+        _abort_bad_request(f"Message exceeds maximum length of {MAX_MESSAGE_LENGTH} characters")
+
+    session_id = data.get("session_id")
+    if not session_id:
+        # Generate UUID for session if not provided; uuid4().hex always matches SESSION_ID_PATTERN
+        session_id = uuid.uuid4().hex
+    elif not isinstance(session_id, str) or not _valid_session_id(session_id):
+        # Validate client-provided session_id format (alphanumeric and hyphens only)
+        _abort_bad_request("Invalid session_id format")
+
+    return user_message, session_id
+
+
+def _sse_event(data: dict[str, Any], event: str | None = None) -> bytes:
+    """Encode a server-sent event with a JSON data payload."""
+
+    prefix = f"event: {event}\n".encode() if event else b""
+    return prefix + b"data: " + orjson.dumps(data) + b"\n\n"
 
 
 @app.post("/chat")
@@ -107,53 +289,65 @@ def chat():
         "session_id": "optional-session-id"
     }
     """
+    user_message, session_id = _parse_chat_request()
+
+    # Get agent response with thread-safe conversation history access
     try:
-        data = request.get_json()
+        history = _get_history(session_id)
 
-        if not data or "message" not in data:
-            return jsonify({"error": "Missing 'message' in request"}), 400
+        response = app.config["agent"].chat(message=user_message, history=history)
 
-        user_message = data["message"]
+        _store_messages(session_id, user_message, response.content)
 
-        # Validate message type
-        if not isinstance(user_message, str):
-            return jsonify({"error": "Message must be a string"}), 400
+    except Exception:
+        logger.exception("Agent error")
+        return _error_response("Failed to process message", 500)
 
-        # Validate message length
-        if len(user_message) > MAX_MESSAGE_LENGTH:
-            return jsonify({"error": f"Message exceeds maximum length of {MAX_MESSAGE_LENGTH} characters"}), 400
+    return jsonify(
+        {
+            "response": response.content,
+            "session_id": session_id,
+            "agent": app.config["agent"].name,
+            **response.metadata,
+        }
+    )
 
-        # Generate UUID for session if not provided
-        session_id = data.get("session_id") or str(uuid.uuid4())
 
-        # Validate session_id format (alphanumeric and hyphens only)
-        if not isinstance(session_id, str) or not _valid_session_id(session_id):
-            return jsonify({"error": "Invalid session_id format"}), 400
+@app.post("/chat/stream")
+def chat_stream():
+    """
+    Streaming chat endpoint that sends the reply as server-sent events
 
-        # Get agent response with thread-safe conversation history access
-        try:
-            history = _get_history(session_id)
+    Accepts the same payload as /chat. Emits a ``data: {"delta": ...}`` event per
+    chunk, then an ``event: done`` event carrying the session ID (or ``event: error``
+    if the agent fails). The turn is stored once the full reply has been sent.
+    """
+    user_message, session_id = _parse_chat_request()
+    agent = app.config["agent"]
+    history = _get_history(session_id)
 
-            response = app.config["agent"].chat(message=user_message, history=history)
+    def generate() -> Iterator[bytes]:
+        chunks: list[str] = []
+        try:
+            if isinstance(agent, StreamingAgent):
+                for chunk in agent.chat_stream(message=user_message, history=history):
+                    chunks.append(chunk)
+                    yield _sse_event({"delta": chunk})
+            else:
+                content = agent.chat(message=user_message, history=history).content
+                chunks.append(content)
+                yield _sse_event({"delta": content})
 
-            _store_messages(session_id, user_message, response.content)
+            _store_messages(session_id, user_message, "".join(chunks))
 
-            return jsonify(
-                {
-                    "response": response.content,
-                    "session_id": session_id,
-                    "agent": app.config["agent"].name,
-                    **response.metadata,
-                }
-            )
+        except Exception:
+            logger.exception("Agent error")
+            yield _sse_event({"error": "Failed to process message"}, event="error")
+            return
 
-        except Exception as e:
-            logger.error(f"Agent error: {e}", exc_info=True)
-            return jsonify({"error": "Failed to process message"}), 500
+        yield _sse_event({"session_id": session_id, "agent": agent.name}, event="done")
 
-    except Exception as e:
-        logger.error(f"Request error: {e}", exc_info=True)
-        return jsonify({"error": "Invalid request"}), 400
+    return Response(generate(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 @app.post("/webhook")
@@ -162,13 +356,13 @@ def webhook():
 
     try:
         data = request.get_json(silent=True)
-        headers = dict(request.headers)
 
         logger.info("Webhook received")
-        logger.debug("Headers: %s", headers)
-        logger.debug("Payload: %s", data)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Headers: %s", dict(request.headers))
+            logger.debug("Payload: %s", data)
 
-        event_type = headers.get("X-Event-Type", "unknown")
+        event_type = request.headers.get("X-Event-Type", "unknown")
 
         return jsonify(
             {
@@ -178,9 +372,9 @@ def webhook():
             }
         )
 
-    except Exception as e:
-        logger.error(f"Webhook error: {e}", exc_info=True)
-        return jsonify({"error": "Failed to process webhook"}), 500
+    except Exception:
+        logger.exception("Webhook error")
+        return _error_response("Failed to process webhook", 500)
 
 
 @app.get("/conversations/<session_id>")
@@ -188,11 +382,11 @@ def get_conversation(session_id: str):
     """Retrieve stored conversation history for a session."""
 
     if not _valid_session_id(session_id):
-        return jsonify({"error": "Invalid session_id format"}), 400
+        return _error_response("Invalid session_id format", 400)
 
     history = _peek_conversation(session_id)
     if history is None:
-        return jsonify({"error": "Session not found"}), 404
+        return _error_response("Session not found", 404)
 
     return jsonify(
         {
@@ -208,34 +402,43 @@ def clear_conversation(session_id: str):
     """Clear stored conversation history for a session."""
 
     if not _valid_session_id(session_id):
-        return jsonify({"error": "Invalid session_id format"}), 400
+        return _error_response("Invalid session_id format", 400)
 
     if _clear_conversation(session_id):
         return jsonify({"message": f"Conversation {session_id} cleared"})
 
-    return jsonify({"error": "Session not found"}), 404
+    return _error_response("Session not found", 404)
 
 
 def main(argv: list[str]) -> None:
     """Main entry point."""
 
     # Initialize agent after flags are parsed
-    app.config["agent"] = create_agent_from_env()
+    agent = create_agent_from_env()
+    if FLAGS.response_cache_size > 0:
+        agent = CachedAgent(agent, max_size=FLAGS.response_cache_size)
+    app.config["agent"] = agent
 
     logger.info("🤖 Starting Agent...")
-    logger.info(f"✅ Agent: {app.config['agent'].name}")
+    logger.info("✅ Agent: %s", app.config["agent"].name)
     logger.info("")
     logger.info("⚙️  Configuration:")
-    logger.info(f"   Host: {FLAGS.host}")
-    logger.info(f"   Port: {FLAGS.port}")
-    logger.info(f"   Debug: {FLAGS.debug}")
-    logger.info(f"   Max message length: {MAX_MESSAGE_LENGTH:,}")
+    logger.info("   Host: %s", FLAGS.host)
+    logger.info("   Port: %s", FLAGS.port)
+    logger.info("   Debug: %s", FLAGS.debug)
+    logger.info("   Threads: %s", FLAGS.threads)
+    logger.info("   Response cache size: %s", FLAGS.response_cache_size)
+    logger.info("   Max message length: %d", MAX_MESSAGE_LENGTH)
     logger.info("")
     logger.info("🔌 Bring your own ngrok CLI tunnel. See README for details.")
-    logger.info("🌐 Starting Flask server on http://%s:%s", FLAGS.host, FLAGS.port)
     logger.info("Press Ctrl+C to stop the server")
 
-    app.run(host=FLAGS.host, port=FLAGS.port, debug=FLAGS.debug)
+    if FLAGS.debug:
+        logger.info("🌐 Starting Flask development server on http://%s:%s", FLAGS.host, FLAGS.port)
+        app.run(host=FLAGS.host, port=FLAGS.port, debug=True)
+    else:
+        logger.info("🌐 Starting waitress server on http://%s:%s", FLAGS.host, FLAGS.port)
+        waitress.serve(app, host=FLAGS.host, port=FLAGS.port, threads=FLAGS.threads)
 
 
 if __name__ == "__main__":
@@ -3,19 +3,42 @@ Agent Abstractions
 Provides a clean interface for conversational agents
 """
 
-from typing import Protocol, Optional, Any
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Iterator, Sequence
+from typing import Protocol, Optional, Any, runtime_checkable
+
+# Conversation roles shared by every stored message
+USER_ROLE = "user"
+ASSISTANT_ROLE = "assistant"
 
 
 class Message:
-    """Represents a single message in a conversation"""
+    """Represents a single, immutable message in a conversation"""
+
+    __slots__ = ("role", "content")
+
+    role: str
+    content: str
 
     def __init__(self, role: str, content: str):
         if not isinstance(role, str):
             raise TypeError(f"role must be a string, got {type(role).__name__}")
         if not isinstance(content, str):
             raise TypeError(f"content must be a string, got {type(content).__name__}")
-        self.role = role
-        self.content = content
+        object.__setattr__(self, "role", role)
+        object.__setattr__(self, "content", content)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"Message is immutable; cannot set {name!r}")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"Message is immutable; cannot delete {name!r}")
+
+    def __reduce__(self) -> tuple[type["Message"], tuple[str, str]]:
+        # Rebuild through __init__ so copy and pickle don't assign slots directly
+        return (Message, (self.role, self.content))
 
     def to_dict(self) -> dict[str, str]:
         return {"role": self.role, "content": self.content}
@@ -28,6 +51,8 @@ class Message:
 class AgentResponse:
     """Standard response format from an agent"""
 
+    __slots__ = ("content", "metadata")
+
     def __init__(self, content: str, metadata: Optional[dict[str, Any]] = None):
         if not isinstance(content, str):
             raise TypeError(f"content must be a string, got {type(content).__name__}")
@@ -52,7 +77,7 @@ class Agent(Protocol):
         """Return the name/identifier of this agent"""
         ...
 
-    def chat(self, message: str, history: Optional[list[Message]] = None) -> AgentResponse:
+    def chat(self, message: str, history: Optional[Sequence[Message]] = None) -> AgentResponse:
         """
         Process a chat message and return a response
 
@@ -66,10 +91,33 @@ class Agent(Protocol):
         ...
 
 
+@runtime_checkable
+class StreamingAgent(Agent, Protocol):
+    """
+    Optional extension for agents that can stream their reply
+
+    Agents that implement chat_stream are served incrementally by /chat/stream;
+    other agents fall back to a single chunk from chat().
+    """
+
+    def chat_stream(self, message: str, history: Optional[Sequence[Message]] = None) -> Iterator[str]:
+        """
+        Process a chat message and yield the reply in chunks
+
+        Args:
+            message: The user's message
+            history: Previous conversation history
+
+        Yields:
+            Consecutive pieces of the reply; joined, they form the full reply
+        """
+        ...
+
+
 class EchoAgent:
     """Simple echo agent that repeats the user's message"""
 
-    def chat(self, message: str, history: Optional[list[Message]] = None) -> AgentResponse:
+    def chat(self, message: str, history: Optional[Sequence[Message]] = None) -> AgentResponse:
         """Echo the user's message back with conversation context"""
         message_count = len(history) if history else 0
 
@@ -81,11 +129,88 @@ class EchoAgent:
             },
         )
 
+    def chat_stream(self, message: str, history: Optional[Sequence[Message]] = None) -> Iterator[str]:
+        """Stream the echo as the prefix followed by the user's message"""
+        yield "Echo: "
+        yield message
+
     @property
     def name(self) -> str:
         return "echo-agent"
 
 
+class CachedAgent:
+    """
+    Wraps an agent with an LRU cache of responses
+
+    Repeated (message, history) pairs are answered from the cache without calling
+    the wrapped agent, so only wrap agents whose replies are deterministic.
+    chat_stream is forwarded to the wrapped agent on a cache miss.
+    Cached responses are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, agent: Agent, max_size: int = 512):
+        if max_size <= 0:
+            raise ValueError(f"max_size must be positive, got {max_size}")
+        self.agent = agent
+        self.max_size = max_size
+        self._cache: OrderedDict[bytes, AgentResponse] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(message: str, history: Sequence[Message]) -> bytes:
+        """Digest the conversation so keys stay small no matter how long it is"""
+        digest = hashlib.blake2b(digest_size=16)
+        for text in (*(part for msg in history for part in (msg.role, msg.content)), message):
+            encoded = text.encode()
+            digest.update(len(encoded).to_bytes(8, "little"))
+            digest.update(encoded)
+        return digest.digest()
+
+    def _lookup(self, key: bytes) -> Optional[AgentResponse]:
+        """Return the cached response for key, marking it most recently used"""
+        with self._lock:
+            response = self._cache.get(key)
+            if response is not None:
+                self._cache.move_to_end(key)
+            return response
+
+    def chat(self, message: str, history: Optional[Sequence[Message]] = None) -> AgentResponse:
+        """Return the cached response for this conversation, or ask the wrapped agent"""
+        key = self._cache_key(message, history or ())
+        response = self._lookup(key)
+        if response is not None:
+            return response
+
+        response = self.agent.chat(message=message, history=history)
+
+        with self._lock:
+            self._cache[key] = response
+            if len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        return response
+
+    def chat_stream(self, message: str, history: Optional[Sequence[Message]] = None) -> Iterator[str]:
+        """
+        Yield a cached reply in one chunk, or stream the wrapped agent on a miss
+
+        Streamed replies are not cached: they carry no metadata, so caching them
+        would strip the metadata from later chat() hits. Wrapped agents that
+        cannot stream are answered through chat(), which caches as usual.
+        """
+        response = self._lookup(self._cache_key(message, history or ()))
+        if response is not None:
+            yield response.content
+        elif isinstance(self.agent, StreamingAgent):
+            yield from self.agent.chat_stream(message=message, history=history)
+        else:
+            yield self.chat(message=message, history=history).content
+
+    @property
+    def name(self) -> str:
+        return self.agent.name
+
+
 def create_agent(config: Optional[dict[str, Any]] = None) -> Agent:
     """
     Create an agent instance
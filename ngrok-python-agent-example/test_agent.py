@@ -0,0 +1,298 @@
+"""Tests for the Flask app in agent.py"""
+
+import datetime
+import math
+import threading
+
+import agent
+import orjson
+import pytest
+from agents import AgentResponse, CachedAgent, EchoAgent
+
+
+@pytest.fixture
+def client():
+    """Flask test client backed by an echo agent and an empty conversation store"""
+    agent.app.config["agent"] = EchoAgent()
+    agent.conversations.clear()
+    yield agent.app.test_client()
+    agent.conversations.clear()
+
+
+class TestHealthCheck:
+    """Test the / health check"""
+
+    def test_health_check(self, client):
+        """Test that the health check reports status, agent and limits"""
+        response = client.get("/")
+        assert response.status_code == 200
+        assert response.mimetype == "application/json"
+        data = response.get_json()
+        assert data["status"] == "online"
+        assert data["agent"] == "echo-agent"
+        assert data["max_message_length"] == agent.MAX_MESSAGE_LENGTH
+
+    def test_health_body_is_encoded_once(self, client):
+        """Test that repeated health checks reuse the encoded body"""
+        agent._health_body.cache_clear()
+        client.get("/")
+        client.get("/")
+        assert agent._health_body.cache_info().misses == 1
+
+
+def _parse_sse(body: bytes) -> list[tuple[str, dict]]:
+    """Split a server-sent event stream into (event, data) pairs"""
+    events = []
+    for block in body.decode().strip().split("\n\n"):
+        event = "message"
+        for line in block.split("\n"):
+            field, _, value = line.partition(": ")
+            if field == "event":
+                event = value
+            elif field == "data":
+                events.append((event, orjson.loads(value)))
+    return events
+
+
+class TestChatStream:
+    """Test the /chat/stream server-sent events endpoint"""
+
+    def test_stream_sends_deltas_then_done(self, client):
+        """Test that the reply arrives as deltas followed by a done event"""
+        response = client.post("/chat/stream", json={"message": "Hello", "session_id": "streamed"})
+        assert response.status_code == 200
+        assert response.mimetype == "text/event-stream"
+
+        events = _parse_sse(response.data)
+        assert events[:-1] == [("message", {"delta": "Echo: "}), ("message", {"delta": "Hello"})]
+        assert events[-1] == ("done", {"session_id": "streamed", "agent": "echo-agent"})
+
+    def test_stream_stores_the_full_turn(self, client):
+        """Test that the streamed reply is stored once the stream is consumed"""
+        response = client.post("/chat/stream", json={"message": "Hello", "session_id": "streamed"})
+        response.get_data()
+
+        data = client.get("/conversations/streamed").get_json()
+        assert data["messages"] == [
+            {"role": "user", "content": "Hello"},
+            {"role": "assistant", "content": "Echo: Hello"},
+        ]
+
+    def test_non_streaming_agent_sends_single_delta(self, client):
+        """Test that agents without chat_stream fall back to one chunk from chat()"""
+
+        class PlainAgent:
+            name = "plain-agent"
+
+            def chat(self, message, history=None):
+                return AgentResponse(f"Plain: {message}")
+
+        agent.app.config["agent"] = PlainAgent()
+        response = client.post("/chat/stream", json={"message": "Hello", "session_id": "fallback"})
+
+        events = _parse_sse(response.data)
+        assert events[0] == ("message", {"delta": "Plain: Hello"})
+        assert events[-1][0] == "done"
+
+    def test_cached_agent_still_streams(self, client):
+        """Test that --response_cache_size does not turn streaming into a single chunk"""
+        agent.app.config["agent"] = CachedAgent(EchoAgent())
+        response = client.post("/chat/stream", json={"message": "Hello", "session_id": "cached"})
+
+        events = _parse_sse(response.data)
+        assert events[:2] == [("message", {"delta": "Echo: "}), ("message", {"delta": "Hello"})]
+        assert events[-1][0] == "done"
+
+    def test_stream_validates_payload(self, client):
+        """Test that /chat/stream rejects invalid payloads like /chat"""
+        response = client.post("/chat/stream", json={"message": 42})
+        assert response.status_code == 400
+        assert response.get_json() == {"error": "Message must be a string"}
+
+
+class TestJSONHandling:
+    """Test orjson-backed request parsing and response encoding"""
+
+    def test_chat_round_trips_unicode(self, client):
+        """Test that non-ASCII text is decoded and echoed back unescaped"""
+        response = client.post("/chat", data='{"message": "héllo"}'.encode(), content_type="application/json")
+        assert response.status_code == 200
+        assert "Echo: héllo".encode() in response.data
+
+    @pytest.mark.parametrize(
+        "body",
+        [b'{"message": "hi", "n": NaN}', b'{"message": "hi", "d": 1e400}', b'{"message": "\\ud800"}'],
+        ids=["nan", "overflowing-float", "lone-surrogate"],
+    )
+    def test_chat_accepts_bodies_the_stdlib_decoder_accepts(self, client, body):
+        """Test that bodies orjson rejects but the stdlib parses are still accepted"""
+        response = client.post("/chat", data=body, content_type="application/json")
+        assert response.status_code == 200
+
+    def test_loads_honours_stdlib_kwargs(self):
+        """Test that keyword arguments such as parse_float are not dropped"""
+        assert agent.app.json.loads("1.5", parse_float=str) == "1.5"
+
+    @pytest.mark.parametrize("body", [b"{not json", b'["message"]', b'"message"', b"null"])
+    def test_chat_rejects_invalid_payloads(self, client, body):
+        """Test that unparseable or non-object bodies return a 400"""
+        response = client.post("/chat", data=body, content_type="application/json")
+        assert response.status_code == 400
+        assert response.get_json() == {"error": "Invalid request"}
+
+    @pytest.mark.parametrize(
+        ("metadata", "expected"),
+        [({"usage": {1: 2}}, {"usage": {"1": 2}}), ({"tokens": 2**70}, {"tokens": 2**70})],
+    )
+    def test_chat_encodes_metadata_like_stdlib_json(self, client, metadata, expected):
+        """Test that non-str keys and wide integers in agent metadata still encode"""
+
+        class MetadataAgent(EchoAgent):
+            def chat(self, message, history=None):
+                return AgentResponse("ok", metadata)
+
+        agent.app.config["agent"] = MetadataAgent()
+        response = client.post("/chat", json={"message": "Hello"})
+        assert response.status_code == 200
+        assert response.get_json().items() >= expected.items()
+
+    @pytest.mark.parametrize("extra", [{}, {"wide": 2**70}], ids=["orjson", "stdlib-fallback"])
+    def test_chat_encodes_dates_and_nan_the_same_on_both_paths(self, client, extra):
+        """Test that dates and NaN encode identically whether or not the stdlib fallback runs"""
+        metadata = {"t": datetime.date(2020, 1, 2), "nan": math.nan, **extra}
+
+        class MetadataAgent(EchoAgent):
+            def chat(self, message, history=None):
+                return AgentResponse("ok", metadata)
+
+        agent.app.config["agent"] = MetadataAgent()
+        response = client.post("/chat", json={"message": "Hello"})
+        assert response.status_code == 200
+        assert b'"nan":null' in response.data
+        assert b'"t":"Thu, 02 Jan 2020 00:00:00 GMT"' in response.data
+
+    def test_dumps_honours_stdlib_kwargs(self):
+        """Test that keyword arguments such as indent are not dropped"""
+        assert agent.app.json.dumps({"a": 1}, indent=2) == '{\n  "a": 1\n}'
+
+    def test_chat_response_keys_are_sorted(self, client):
+        """Test that responses keep Flask's default sorted key order"""
+        response = client.post("/chat", json={"message": "Hello", "session_id": "sorted"})
+        keys = list(orjson.loads(response.data))
+        assert keys == sorted(keys)
+
+    def test_chat_rejects_non_json_content_type(self, client):
+        """Test that a non-JSON request returns a 400"""
+        response = client.post("/chat", data="message=hi", content_type="text/plain")
+        assert response.status_code == 400
+
+
+class TestErrorHandling:
+    """Test error responses"""
+
+    def test_missing_message(self, client):
+        """Test that a payload without a message is rejected"""
+        response = client.post("/chat", json={"session_id": "abc"})
+        assert response.status_code == 400
+        assert response.get_json() == {"error": "Missing 'message' in request"}
+
+    def test_unexpected_error_returns_json(self, client):
+        """Test that failures outside the agent call still produce a JSON 500"""
+
+        class UnserializableAgent(EchoAgent):
+            def chat(self, message, history=None):
+                return AgentResponse("ok", {"unserializable": object()})
+
+        agent.app.config["agent"] = UnserializableAgent()
+        response = client.post("/chat", json={"message": "Hello"})
+        assert response.status_code == 500
+        assert response.get_json() == {"error": "Internal server error"}
+
+    def test_http_errors_pass_through(self, client):
+        """Test that routing errors keep their own status codes"""
+        assert client.get("/does-not-exist").status_code == 404
+
+
+class TestConversationLimits:
+    """Test bounds on the in-memory conversation store"""
+
+    def test_history_is_capped(self, client, monkeypatch):
+        """Test that only the most recent messages are kept per session"""
+        monkeypatch.setattr(agent, "MAX_HISTORY_MESSAGES", 4)
+        for i in range(5):
+            client.post("/chat", json={"message": f"msg-{i}", "session_id": "capped"})
+
+        data = client.get("/conversations/capped").get_json()
+        assert data["message_count"] == 4
+        assert data["messages"][0] == {"role": "user", "content": "msg-3"}
+        assert data["messages"][-1] == {"role": "assistant", "content": "Echo: msg-4"}
+
+    def test_least_recently_used_session_is_evicted(self, client, monkeypatch):
+        """Test that the store evicts the least recently used session when full"""
+        monkeypatch.setattr(agent, "MAX_SESSIONS", 2)
+        client.post("/chat", json={"message": "hi", "session_id": "first"})
+        client.post("/chat", json={"message": "hi", "session_id": "second"})
+        client.post("/chat", json={"message": "again", "session_id": "first"})
+        client.post("/chat", json={"message": "hi", "session_id": "third"})
+
+        assert client.get("/conversations/second").status_code == 404
+        assert client.get("/conversations/first").get_json()["message_count"] == 4
+        assert client.get("/conversations/third").status_code == 200
+
+    def test_reading_a_session_counts_as_use(self, client, monkeypatch):
+        """Test that GET /conversations/<id> protects a session from eviction"""
+        monkeypatch.setattr(agent, "MAX_SESSIONS", 2)
+        client.post("/chat", json={"message": "hi", "session_id": "first"})
+        client.post("/chat", json={"message": "hi", "session_id": "second"})
+        client.get("/conversations/first")
+        client.post("/chat", json={"message": "hi", "session_id": "third"})
+
+        assert client.get("/conversations/first").status_code == 200
+        assert client.get("/conversations/second").status_code == 404
+
+
+class TestSessionIdValidation:
+    """Test session ID validation"""
+
+    @pytest.mark.parametrize("session_id", ["abc", "ABC-123", "0f8fad5b-d9cb-469f-a165-70867728950e", "a" * 128])
+    def test_valid_session_ids(self, session_id):
+        """Test that ASCII letters, digits and hyphens are accepted"""
+        assert agent._valid_session_id(session_id)
+
+    @pytest.mark.parametrize("session_id", ["", "a" * 129, "a" * 10_000, "has space", "under_score", "café", "a\n"])
+    def test_invalid_session_ids(self, session_id):
+        """Test that empty, overlong and non-ASCII-alphanumeric IDs are rejected"""
+        assert not agent._valid_session_id(session_id)
+
+    def test_generated_session_id(self, client):
+        """Test that a missing session_id is replaced by a valid generated one"""
+        data = client.post("/chat", json={"message": "Hello"}).get_json()
+        assert agent.SESSION_ID_PATTERN.fullmatch(data["session_id"])
+
+    def test_chat_rejects_invalid_session_id(self, client):
+        """Test that /chat rejects a malformed client-provided session_id"""
+        response = client.post("/chat", json={"message": "Hello", "session_id": "not valid"})
+        assert response.status_code == 400
+        assert response.get_json() == {"error": "Invalid session_id format"}
+
+
+class TestConcurrentUpdates:
+    """Test concurrent access to the conversation store"""
+
+    def test_concurrent_stores_keep_every_turn(self, client, monkeypatch):
+        """Test that concurrent turns on one session are never lost"""
+        monkeypatch.setattr(agent, "MAX_HISTORY_MESSAGES", 1000)
+
+        def store_turns():
+            for i in range(10):
+                agent._store_messages("shared", f"msg-{i}", f"reply-{i}")
+
+        threads = [threading.Thread(target=store_turns) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        history = agent._peek_conversation("shared")
+        assert history is not None
+        assert len(history) == 100
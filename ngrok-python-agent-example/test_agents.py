@@ -1,7 +1,19 @@
 """Tests for the agent abstraction layer"""
 
+import copy
+import pickle
+
 import pytest
-from agents import Message, AgentResponse, EchoAgent, create_agent, create_agent_from_env
+from agents import (
+    USER_ROLE,
+    Message,
+    AgentResponse,
+    CachedAgent,
+    EchoAgent,
+    StreamingAgent,
+    create_agent,
+    create_agent_from_env,
+)
 
 
 class TestMessage:
@@ -19,6 +31,45 @@ class TestMessage:
         result = msg.to_dict()
         assert result == {"role": "assistant", "content": "Hi there"}
 
+    def test_message_to_dict_returns_independent_copy(self):
+        """Test that mutating the to_dict result does not change the message"""
+        msg = Message("user", "Hello")
+        result = msg.to_dict()
+        result["content"] = "Changed"
+        assert msg.content == "Hello"
+        assert msg.to_dict() == {"role": "user", "content": "Hello"}
+
+    def test_message_is_immutable(self):
+        """Test that message fields cannot be reassigned"""
+        msg = Message("user", "Hello")
+        with pytest.raises(AttributeError):
+            msg.content = "Changed"  # type: ignore[misc]
+
+    def test_message_cannot_be_deleted(self):
+        """Test that message fields cannot be deleted"""
+        msg = Message("user", "Hello")
+        with pytest.raises(AttributeError):
+            del msg.content  # type: ignore[misc]
+        assert msg.content == "Hello"
+
+    @pytest.mark.parametrize(
+        "clone",
+        [copy.copy, copy.deepcopy, lambda msg: pickle.loads(pickle.dumps(msg))],
+        ids=["copy", "deepcopy", "pickle"],
+    )
+    def test_message_round_trips(self, clone):
+        """Test that messages survive copy, deepcopy and pickle"""
+        msg = Message("assistant", "Hi there")
+        cloned = clone(msg)
+        assert cloned is not msg
+        assert cloned.to_dict() == {"role": "assistant", "content": "Hi there"}
+
+    def test_message_has_no_instance_dict(self):
+        """Test that Message stores its fields in __slots__ to keep per-message overhead small"""
+        msg = Message(USER_ROLE, "Hello")
+        assert Message.__slots__ == ("role", "content")
+        assert not hasattr(msg, "__dict__")
+
     def test_message_from_dict(self):
         """Test creating message from dict"""
         data = {"role": "user", "content": "Test"}
@@ -111,6 +162,12 @@ class TestEchoAgent:
         agent = EchoAgent()
         assert agent.name == "echo-agent"
 
+    def test_agent_chat_stream(self):
+        """Test that the streamed chunks join to the same reply as chat()"""
+        agent = EchoAgent()
+        assert isinstance(agent, StreamingAgent)
+        assert "".join(agent.chat_stream("Hello")) == agent.chat("Hello").content
+
     def test_agent_empty_message(self):
         """Test agent handles empty message"""
         agent = EchoAgent()
@@ -120,6 +177,114 @@ class TestEchoAgent:
         assert response.metadata["echo_length"] == 0
 
 
+class CountingAgent(EchoAgent):
+    """Echo agent that records how often it is called"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def chat(self, message, history=None):
+        self.calls += 1
+        return super().chat(message, history)
+
+
+class TestCachedAgent:
+    """Test CachedAgent wrapper"""
+
+    def test_repeated_message_is_cached(self):
+        """Test that a repeated conversation is answered from the cache"""
+        inner = CountingAgent()
+        agent = CachedAgent(inner)
+
+        first = agent.chat("Hello")
+        second = agent.chat("Hello")
+
+        assert second is first
+        assert inner.calls == 1
+
+    def test_history_is_part_of_key(self):
+        """Test that the same message with different history misses the cache"""
+        inner = CountingAgent()
+        agent = CachedAgent(inner)
+
+        agent.chat("Hello")
+        response = agent.chat("Hello", history=[Message("user", "Hi"), Message("assistant", "Echo: Hi")])
+
+        assert inner.calls == 2
+        assert response.metadata["message_count"] == 2
+
+    def test_key_does_not_confuse_message_boundaries(self):
+        """Test that shifting text between messages changes the key"""
+        inner = CountingAgent()
+        agent = CachedAgent(inner)
+
+        agent.chat("c", history=[Message("user", "ab")])
+        agent.chat("bc", history=[Message("user", "a")])
+
+        assert inner.calls == 2
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """Test that the cache never grows beyond max_size"""
+        inner = CountingAgent()
+        agent = CachedAgent(inner, max_size=2)
+
+        agent.chat("one")
+        agent.chat("two")
+        agent.chat("one")
+        agent.chat("three")
+        agent.chat("one")
+        assert inner.calls == 3
+
+        agent.chat("two")
+        assert inner.calls == 4
+
+    def test_stream_is_forwarded_on_miss(self):
+        """Test that chat_stream streams the wrapped agent's chunks on a cache miss"""
+        inner = CountingAgent()
+        agent = CachedAgent(inner)
+
+        assert list(agent.chat_stream("Hello")) == ["Echo: ", "Hello"]
+        assert inner.calls == 0
+
+    def test_stream_uses_cached_response(self):
+        """Test that chat_stream answers a cached conversation in one chunk"""
+        inner = CountingAgent()
+        agent = CachedAgent(inner)
+
+        agent.chat("Hello")
+        assert list(agent.chat_stream("Hello")) == ["Echo: Hello"]
+        assert inner.calls == 1
+
+    def test_stream_falls_back_to_chat_for_non_streaming_agents(self):
+        """Test that chat_stream uses (and fills) the cache when the wrapped agent cannot stream"""
+
+        class PlainAgent:
+            name = "plain-agent"
+
+            def __init__(self):
+                self.calls = 0
+
+            def chat(self, message, history=None):
+                self.calls += 1
+                return AgentResponse(f"Plain: {message}")
+
+        inner = PlainAgent()
+        agent = CachedAgent(inner)
+
+        assert list(agent.chat_stream("Hello")) == ["Plain: Hello"]
+        assert list(agent.chat_stream("Hello")) == ["Plain: Hello"]
+        assert inner.calls == 1
+
+    def test_name_delegates_to_wrapped_agent(self):
+        """Test that the wrapper reports the wrapped agent's name"""
+        assert CachedAgent(EchoAgent()).name == "echo-agent"
+
+    def test_invalid_max_size(self):
+        """Test that CachedAgent rejects a non-positive max_size"""
+        with pytest.raises(ValueError, match="max_size must be positive"):
+            CachedAgent(EchoAgent(), max_size=0)
+
+
 class TestFactoryFunctions:
     """Test factory functions"""
 